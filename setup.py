@@ -13,7 +13,10 @@ setup(name = 'symd',
       author = 'Jan Medved',
       author_email = 'jmedved@cisco.com',
       license = 'New-style BSD',
-      install_requires = ['networkx>=1.10', 'numpy>=1.10.1', 'matplotlib>=1.5.0'],
+      python_requires = '>=3.7',
+      install_requires = ['networkx>=2.0', 'numpy>=1.10.1'],
+      # Only needed for --graph and --sub-graphs
+      extras_require = {'plot': ['matplotlib>=1.5.0']},
       include_package_data = True,
       keywords = ['yang', 'dependencies'],
       classifiers = []
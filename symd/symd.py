@@ -5,20 +5,21 @@
 # terms of the Eclipse Public License v1.0 which accompanies this distribution,
 # and is available at http://www.eclipse.org/legal/epl-v10.html
 ##############################################################################
-from __future__ import print_function  # Must be at the beginning of the file
-
-# On macos, plotting current;y won't work. TBD.
+# orjson is optional; it is only used to speed up writing D3.js JSON files
 try:
-    import matplotlib.pyplot as plt
-except:
-    pass
+    import orjson
+except ImportError:
+    orjson = None
 
 import networkx as nx
-import glob
 import sys
 import os
 import re
 import json
+import mmap
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 __author__ = "Jan Medved, Einar Nilsen-Nygaard"
 __copyright__ = "Copyright(c) 2015, Cisco Systems, Inc."
@@ -27,12 +28,27 @@ __email__ = "jmedved@cisco.com, einarnn@cisco.com"
 
 G = nx.DiGraph()
 
-# Regular expressions for parsing yang files; we are only interested in
-# the 'module', 'import' and 'revision' statements
-MODULE_STATEMENT = re.compile('''^[ \t]*(sub)?module +(["'])?([-A-Za-z0-9]*(@[0-9-]*)?)(["'])? *\{.*$''')
-IMPORT_STATEMENT = re.compile('''^[ \t]*import[\s]*([-A-Za-z0-9]*)?[\s]*\{([\s]*prefix[\s]*[\S]*;[\s]*})?.*$''')
-INCLUDE_STATEMENT = re.compile('''^[ \t]*include[\s]*([-A-Za-z0-9]*)?[\s]*\{.*$''')
-REVISION_STATEMENT = re.compile('''^[ \t]*revision[\s]*(['"])?([-0-9]*)?(['"])?[\s]*\{.*$''')
+# Regular expression for parsing yang files; we are only interested in
+# the 'module', 'import'/'include' and 'revision' statements. All four
+# statements are matched by a single pattern: each statement is captured
+# by a group named after it (reported by match.lastgroup), immediately
+# followed by the group capturing the statement's argument. The pattern
+# works on bytes (i.e. ASCII-only character classes), so files are parsed
+# without being decoded. Like STATEMENT_KEYWORDS, it only accepts blanks
+# (spaces and tabs) as separators within a statement.
+YANG_STATEMENT = re.compile(b'''^[ \t]*(?:'''
+                            b'''(?P<module>(?:sub)?module +["']?([-A-Za-z0-9]*(?:@[0-9-]*)?)["']? *\{)'''
+                            b'''|(?P<import>import[ \t]*([-A-Za-z0-9]*)[ \t]*\{)'''
+                            b'''|(?P<include>include[ \t]*([-A-Za-z0-9]*)[ \t]*\{)'''
+                            b'''|(?P<revision>revision[ \t]*['"]?([-0-9]*)['"]?[ \t]*\{))''')
+
+# Leading keywords (including the separator that must follow them) of the
+# statements matched by YANG_STATEMENT
+STATEMENT_KEYWORDS = (b'module ', b'submodule ', b'import ', b'import\t', b'include ', b'include\t',
+                      b'revision ', b'revision\t')
+
+# Yang files of at least this size (in bytes) are memory-mapped for parsing
+LARGE_FILE_SIZE = 64 * 1024
 
 # Node Attribute Types
 TAG_ATTR = 'tag'
@@ -46,6 +62,118 @@ DRAFT_TAG = 'draft'
 UNKNOWN_TAG = 'unknown'
 
 
+class Context:
+    """
+    A directed graph of yang module dependencies, together with data derived
+    from the graph (markers, reachable modules, ...) that is computed on
+    first use and reused by later queries. Functions working on the
+    dependency graph take an optional 'ctx' argument; if it is not
+    specified, they work on the global variable G (see get_context()).
+    Functions that change the graph drop the derived data; call clear()
+    after changing the graph directly.
+    """
+
+    def __init__(self, graph=None):
+        """
+        :param graph: Directed graph of yang module dependencies; an empty
+                      graph is created if not specified
+        """
+        if graph is None:
+            graph = nx.DiGraph()
+        self.graph = graph
+        self.clear()
+
+    def clear(self):
+        """
+        Drop all data derived from the graph
+        :return: None
+        """
+        self._markers = None
+        self._successors = None
+        self._predecessors = None
+        self._reachable = {}
+
+    def markers(self):
+        """
+        :return: Dictionary of module name to marker (see get_markers())
+        """
+        if self._markers is None:
+            self._markers = get_markers(self.graph)
+        return self._markers
+
+    def successors(self):
+        """
+        :return: Dictionary of module name to tuple of imported modules (see
+                 get_successor_map())
+        """
+        if self._successors is None:
+            self._successors = get_successor_map(self.graph)
+        return self._successors
+
+    def predecessors(self):
+        """
+        :return: Dictionary of module name to tuple of importing modules
+                 (see get_predecessor_map())
+        """
+        if self._predecessors is None:
+            self._predecessors = get_predecessor_map(self.graph)
+        return self._predecessors
+
+    def reachable(self, reverse=False):
+        """
+        :param reverse: If True, get ancestors rather than descendants
+        :return: Dictionary mapping each module to its set of reachable
+                 modules (see get_reachable_modules()); the sets are shared,
+                 so callers must not modify them
+        """
+        if reverse not in self._reachable:
+            self._reachable[reverse] = get_reachable_modules(self.graph, reverse)
+        return self._reachable[reverse]
+
+    def descendants(self, node_name):
+        """
+        Get all modules that the specified module depends on, directly or
+        indirectly. If the descendants of all modules have already been
+        computed, they are reused rather than searching the graph again.
+        :param node_name: Module to query
+        :return: Set of modules, which the caller may modify
+        """
+        if False in self._reachable:
+            return set(self._reachable[False][node_name])
+        return get_reachable(self.successors().__getitem__, node_name)
+
+    def ancestors(self, node_name):
+        """
+        Get all modules that depend on the specified module, directly or
+        indirectly (see descendants())
+        :param node_name: Module to query
+        :return: Set of modules, which the caller may modify
+        """
+        if True in self._reachable:
+            return set(self._reachable[True][node_name])
+        return get_reachable(self.predecessors().__getitem__, node_name)
+
+
+# Context for the global variable G, see get_context(). This is private so
+# that 'from symd import *' does not copy a binding that may be replaced.
+_default_context = None
+
+
+def get_context(ctx=None):
+    """
+    Get the context to work on
+    :param ctx: Context specified by the caller, if any
+    :return: ctx or, if ctx is None, the context for the global variable G
+    """
+    global _default_context
+    if ctx is not None:
+        return ctx
+    # G may have been replaced since the context was created
+    if _default_context is None or _default_context.graph is not G:
+        _default_context = Context(G)
+    return _default_context
+
+
 def warning(s, verbose=False):
     """
     Prints out a warning message to stderr.
@@ -65,6 +193,40 @@ def error(s):
     print("ERROR: %s" % s, file=sys.stderr)
 
 
+def get_yang_files_in_directory(directory, recurse=False):
+    """
+    Gets the list of all yang module files in the specified directory. The
+    directory is listed with os.scandir(), which returns the type of each
+    entry along with its name, so no extra stat() is needed for regular
+    files and directories.
+    :param directory: Directory where yang modules may be located
+    :param recurse: If True, also look in all sub-directories (following
+                    symbolic links), in the same order as os.walk()
+    :return: list of all *.yang files in the directory
+    """
+    yfs = []
+    dirs = [directory]
+    while dirs:
+        # Like glob()/os.walk(): directories that can't be listed yield no
+        # files
+        try:
+            with os.scandir(dirs.pop()) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        sub_dirs = []
+        for e in entries:
+            # Like glob('*.yang'), hidden files are skipped when not
+            # recursing; os.walk() used to return them when recursing
+            if e.name.endswith('.yang') and e.is_file() and (recurse or not e.name.startswith('.')):
+                yfs.append(e.path)
+            elif recurse and e.is_dir():
+                sub_dirs.append(e.path)
+        # Visit sub-directories depth-first, in listing order
+        dirs.extend(reversed(sub_dirs))
+    return yfs
+
+
 def get_local_yang_files(local_repos, recurse=False):
     """
     Gets the list of all yang module files in the specified local repositories
@@ -73,19 +235,8 @@ def get_local_yang_files(local_repos, recurse=False):
     :return: list of all *.yang files in the local repositories
     """
     yfs = []
-    if not recurse:
-       for repo in local_repos:
-            if repo.endswith('/'):
-                yfs.extend(glob.glob('%s*.yang' % repo))
-            else:
-                yfs.extend(glob.glob('%s/*.yang' % repo))
-    else:
-        for repo in local_repos:
-            for path, sub, files in os.walk(repo, followlinks=True):
-                for f in files:
-                    if f.endswith('.yang'):
-                        yfs.append(os.path.join(path, f))
-
+    for repo in local_repos:
+        yfs.extend(get_yang_files_in_directory(repo, recurse))
     return yfs
 
 
@@ -93,77 +244,174 @@ def parse_yang_module(lines):
     """
     Parses a yang module; look for the 'module', 'import'/'include' and
     'revision' statements
-    :param lines: Pre-parsed yang files as a list of lines
-    :return: module name, module type (module or sub-module), list of
-             imports and list of revisions
+    :param lines: Iterable yielding the lines of a yang file as bytes (e.g.
+                  a file opened in binary mode), with or without the
+                  trailing newline
+    :return: module name, module type (module or sub-module), tuple of
+             imports (in order of first appearance, without duplicates) and
+             latest revision (None if the module has no revision statement)
     """
     module = None
     mod_type = None
-    revisions = []
+    revision = None
     imports = []
+    imported = set()
+
+    # Bind the compiled matcher, the keywords and bytes.lstrip once; this
+    # loop runs for every line of every scanned file
+    match_statement = YANG_STATEMENT.match
+    keywords = STATEMENT_KEYWORDS
+    lstrip = bytes.lstrip
 
     for line in lines:
-        match = MODULE_STATEMENT.match(line)
-        if match:
-            module = match.groups()[2]
-            if match.groups()[0] == 'sub':
+        # Most lines in a yang file are none of the statements we are
+        # looking for; only run the regex when the leading keyword fits.
+        # Only strip the blanks that YANG_STATEMENT allows before it.
+        if not lstrip(line, b' \t').startswith(keywords):
+            continue
+        match = match_statement(line)
+        if not match:
+            continue
+        statement = match.lastgroup
+        # Only the (ASCII) statement argument is decoded
+        argument = match.group(match.lastindex + 1).decode('ascii')
+        if statement == 'module':
+            module = argument
+            if match.group('module').startswith(b'sub'):
                 mod_type = 'sub'
             else:
                 mod_type = 'mod'
-        match = IMPORT_STATEMENT.match(line)
-        if match:
-            imports.append(match.groups()[0])
-        match = INCLUDE_STATEMENT.match(line)
-        if match:
-            imports.append(match.groups()[0])
-        match = REVISION_STATEMENT.match(line)
-        if match:
-            revisions.append(match.groups()[1])
-    return module, mod_type, imports, revisions
+        elif statement == 'revision':
+            # Revisions are dates (YYYY-MM-DD), so the latest revision is
+            # also the largest string
+            if revision is None or argument > revision:
+                revision = argument
+        else:
+            # A module may import and include the same module; record it
+            # only once so that it yields a single dependency
+            if argument not in imported:
+                imported.add(argument)
+                imports.append(argument)
+    return module, mod_type, tuple(imports), revision
+
+
+def parse_yang_file(yf):
+    """
+    Reads and parses the specified yang file. This is the unit of work that
+    scan_yang_files() hands out to its worker processes.
+    :param yf: Name of the yang file
+    :return: module name, module type, tuple of imports and latest
+             revision (see parse_yang_module()), or the IOError raised when
+             the file could not be read
+    """
+    try:
+        with open(yf, 'rb', buffering=0) as yfd:
+            mm = None
+            if os.fstat(yfd.fileno()).st_size >= LARGE_FILE_SIZE:
+                # Map large files rather than reading them into memory. If
+                # the file system does not support that (or the file shrank
+                # to nothing), read the file like a small one.
+                try:
+                    mm = mmap.mmap(yfd.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    pass
+            if mm is None:
+                # Read the file with a single read() and split it into lines
+                # in one go rather than line by line
+                return parse_yang_module(yfd.read().split(b'\n'))
+            try:
+                return parse_yang_module(iter(mm.readline, b''))
+            finally:
+                mm.close()
+    except IOError as ioe:
+        return ioe
+
+
+def scan_yang_files(yfiles, jobs=None):
+    """
+    Parses the specified yang files in a pool of worker processes. Results
+    are yielded in file order as soon as they are available, so that the
+    caller processes them while the remaining files are still being read
+    and parsed.
+    :param yfiles: List of files containing yang modules
+    :param jobs: Number of worker processes, defaults to the number of CPUs
+                 (and at most one per file). With a single job, or if the platform has no
+                 multiprocessing support, the files are parsed serially in
+                 the calling process.
+    :return: Iterator over (file name, parse_yang_file() result) tuples
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    # Don't start more workers than there are files to parse
+    jobs = min(jobs, len(yfiles))
+    executor = None
+    if jobs > 1:
+        try:
+            executor = ProcessPoolExecutor(max_workers=jobs)
+        except (ImportError, NotImplementedError, OSError):
+            pass
+    if executor is None:
+        for yf in yfiles:
+            yield yf, parse_yang_file(yf)
+        return
+    # Hand out several chunks per worker so that all workers stay busy
+    # until the end of the scan
+    chunksize = max(1, len(yfiles) // (4 * jobs))
+    with executor:
+        for result in zip(yfiles, executor.map(parse_yang_file, yfiles, chunksize=chunksize)):
+            yield result
 
 
-def get_yang_modules(yfiles, tag, verbose=False):
+def get_yang_modules(yfiles, tag, verbose=False, jobs=None, ctx=None):
     """
     Creates a list of yang modules from the specified yang files and stores
     them as nodes in a Networkx directed graph. This function also stores
     node attributes (list of imports, tag, revision, ...) for each module
-    in the NetworkX data structures. The function uses the global variable
-    G (directed network graph of yang model dependencies)
+    in the NetworkX data structures. The function uses the context's graph
+    (by default the global variable G, the directed network graph of yang
+    model dependencies)
+    The files are parsed in parallel (see scan_yang_files()); the graph
+    itself is only updated here, in the calling process.
     :param yfiles: List of files containing yang modules
     :param tag: Tag - RFC or draft for now
-    :return: None; resulting nodes are stored in G.
-    """
-    for yf in yfiles:
-        try:
-            with open(yf) as yfd:
-                name, mod_type, imports, revisions = parse_yang_module(yfd.readlines())
-                if len(revisions) > 0:
-                    rev = max(revisions)
-                else:
-                    error("No revision specified for module '%s', file '%s'" % (name, yf))
-                    rev = None
-                attr = {TYPE_ATTR: mod_type, TAG_ATTR: tag, IMPORT_ATTR: imports, REV_ATTR: rev}
-                # IF we already have a module with a lower revision, replace it now
-                try:
-                    en = G.node[name]
-                    en_rev = en[REV_ATTR]
-                    if en_rev:
-                        if rev:
-                            if rev > en_rev:
-                                warning("Replacing revision for module '%s' ('%s' -> '%s')"
-                                        % (name, en_rev, rev),
-                                        verbose)
-                                G.node[name]['attr_dict'] = attr
-                    else:
-                        if rev:
-                            warning("Replacing revision for module '%s' ('%s' -> '%s')"
-                                    % (name, en_rev, rev),
-                                    verbose)
-                            G.node[name]['attr_dict'] = attr
-                except KeyError:
-                    G.add_node(name, attr_dict=attr)
-        except IOError as ioe:
-            print(ioe)
+    :param jobs: Number of worker processes used to parse the files
+    :param ctx: Context to work on (see get_context())
+    :return: None; resulting nodes are stored in the context's graph.
+    """
+    ctx = get_context(ctx)
+    G = ctx.graph
+    for yf, result in scan_yang_files(yfiles, jobs):
+        if isinstance(result, IOError):
+            print(result)
+            continue
+        name, mod_type, imports, rev = result
+        if name is None:
+            # NetworkX does not accept None as a node
+            error("No module statement found in file '%s'" % yf)
+            continue
+        if rev is None:
+            error("No revision specified for module '%s', file '%s'" % (name, yf))
+        attr = {TYPE_ATTR: mod_type, TAG_ATTR: tag, IMPORT_ATTR: imports, REV_ATTR: rev}
+        # IF we already have a module with a lower revision, replace it now
+        if name in G:
+            en = G.nodes[name]
+            en_rev = en[REV_ATTR]
+            if en_rev:
+                if rev:
+                    if rev > en_rev:
+                        warning("Replacing revision for module '%s' ('%s' -> '%s')"
+                                % (name, en_rev, rev),
+                                verbose)
+                        en.update(attr)
+            else:
+                if rev:
+                    warning("Replacing revision for module '%s' ('%s' -> '%s')"
+                            % (name, en_rev, rev),
+                            verbose)
+                    en.update(attr)
+        else:
+            G.add_node(name, **attr)
+    ctx.clear()
 
 
 def prune_graph_nodes(graph, tag):
@@ -173,83 +421,249 @@ def prune_graph_nodes(graph, tag):
     :param tag: Tag for nodes of interest
     :return: List of nodes tagged with the specified tag
     """
-    node_list = []
-    for node_name in graph.nodes_iter():
-        try:
-            if graph.node[node_name][TAG_ATTR] == tag:
-                node_list.append(node_name)
-        except KeyError:
-            pass
-    return node_list
+    # Iterate over (node, tag) pairs rather than looking up each node's
+    # attributes
+    return [node_name for node_name, node_tag in graph.nodes(data=TAG_ATTR) if node_tag == tag]
 
 
-def get_module_dependencies():
+def get_module_dependencies(add_unknown=False, verbose=False, ctx=None):
     """
     Creates the dependencies  between modules (i.e. the edges) in the NetworkX
     directed graph created by 'get_yang_modules()'
-    This function uses the global variable G (directed network graph of yang
-    modules)
+    This function uses the context's graph (by default the global variable
+    G, the directed network graph of yang modules)
+    :param add_unknown: If True, imported modules that were not scanned are
+                        added to the graph with the 'unknown' tag (same as
+                        'get_unknown_modules()', but in the same pass over
+                        the imports); otherwise they are reported as errors
+    :param verbose: Print a warning for each module that was not scanned
+                    (only used if add_unknown is True)
+    :param ctx: Context to work on (see get_context())
     :return: None
     """
-    for node_name in G.nodes_iter():
-        for imp in G.node[node_name][IMPORT_ATTR]:
-            if imp in G.node:
-                G.add_edge(node_name, imp)
+    ctx = get_context(ctx)
+    G = ctx.graph
+    edges = []
+    # Unknown modules in the order they were found
+    unknown_nodes = {}
+    # Bind the lookups done for every import once
+    add_edge = edges.append
+    nodes = G.nodes
+    for node_name, imports in G.nodes(data=IMPORT_ATTR):
+        for imp in imports:
+            if imp in nodes:
+                add_edge((node_name, imp))
+            elif add_unknown:
+                unknown_nodes[imp] = None
+                add_edge((node_name, imp))
+                if verbose:
+                    warning("Module '%s': imports module '%s' that was not scanned"
+                            % (node_name, imp),
+                            verbose)
             else:
                 error("Module '%s': imports unknown module '%s'" % (node_name, imp))
+    # Unknown modules must be added with their attributes before the edges
+    # that point to them
+    for un in unknown_nodes:
+        attr = {TYPE_ATTR: 'module', TAG_ATTR: UNKNOWN_TAG, IMPORT_ATTR: (), REV_ATTR: None}
+        G.add_node(un, **attr)
+    G.add_edges_from(edges)
+    ctx.clear()
+
+
+def get_unknown_modules(verbose=False, ctx=None):
+    ctx = get_context(ctx)
+    G = ctx.graph
+    # Modules imported by several modules are only added once; a dict keeps
+    # them in the order they were found
+    unknown_nodes = {}
+    nodes = G.nodes
+    for node_name, imports in G.nodes(data=IMPORT_ATTR):
+        for imp in imports:
+            if imp not in nodes:
+                unknown_nodes[imp] = None
+                # Don't build the message unless it is going to be printed
+                if verbose:
+                    warning("Module '%s': imports module '%s' that was not scanned"
+                            % (node_name, imp),
+                            verbose)
+    for un in unknown_nodes:
+        attr = {TYPE_ATTR: 'module', TAG_ATTR: UNKNOWN_TAG, IMPORT_ATTR: (), REV_ATTR: None}
+        G.add_node(un, **attr)
+    ctx.clear()
+
+
+def get_reachable(neighbors, node_name):
+    """
+    Breadth-first search from the specified module
+    :param neighbors: Function returning an iterator over the neighbours of
+                      a module (e.g. the graph's successors or predecessors)
+    :param node_name: Module to start the search from
+    :return: Set of modules reachable from node_name, excluding node_name
+    """
+    seen = set([node_name])
+    queue = deque([node_name])
+    while queue:
+        for n in neighbors(queue.popleft()):
+            if n not in seen:
+                seen.add(n)
+                queue.append(n)
+    seen.remove(node_name)
+    return seen
+
+
+def get_dfs_successors(successors, node_name):
+    """
+    Depth-first search from the specified module, visiting imports in
+    order (same as nx.dfs_successors(), but driven by a precomputed
+    successor map rather than by the graph)
+    :param successors: Dictionary of module name to imported modules (e.g.
+                       built once with get_successor_map())
+    :param node_name: Module to start the search from
+    :return: Dictionary of module name to list of its children in the DFS
+             tree; modules without children are omitted
+    """
+    dfs_successors = {}
+    visited = set([node_name])
+    stack = [(node_name, iter(successors[node_name]))]
+    while stack:
+        parent, children = stack[-1]
+        for child in children:
+            if child not in visited:
+                visited.add(child)
+                dfs_successors.setdefault(parent, []).append(child)
+                stack.append((child, iter(successors[child])))
+                break
+        else:
+            stack.pop()
+    return dfs_successors
 
 
-def get_unknown_modules(verbose=False):
-    unknown_nodes = []
-    for node_name in G.nodes_iter():
-        for imp in G.node[node_name][IMPORT_ATTR]:
-            if imp not in G.node:
-                unknown_nodes.append(imp)
-                warning("Module '%s': imports module '%s' that was not scanned"
-                        % (node_name, imp),
-                        verbose)
-    for un in unknown_nodes:
-        attr = {TYPE_ATTR: 'module', TAG_ATTR: UNKNOWN_TAG, IMPORT_ATTR: [], REV_ATTR: None}
-        G.add_node(un, attr_dict=attr)
+def get_successor_map(graph):
+    """
+    Take a read-only snapshot of the graph's adjacency, so that repeated
+    traversals don't go through the NetworkX views. Neighbours are kept in
+    tuples, which are smaller and faster to iterate than NetworkX's
+    per-edge attribute dicts.
+    :param graph: Graph of module dependencies
+    :return: Dictionary of module name to tuple of imported modules
+    """
+    return dict((n, tuple(nbrs)) for n, nbrs in graph.adjacency())
 
 
-def print_impacting_modules(single_node=None, json_out=None):
+def get_predecessor_map(graph):
+    """
+    Take a read-only snapshot of the graph's reverse adjacency (see
+    get_successor_map())
+    :param graph: Graph of module dependencies
+    :return: Dictionary of module name to tuple of importing modules
+    """
+    return dict((n, tuple(nbrs)) for n, nbrs in graph.pred.items())
+
+
+def get_reachable_modules(graph, reverse=False):
+    """
+    For each module in the specified graph, compute the set of modules it
+    depends on (its descendants) or, if reverse is True, the set of modules
+    that depend on it (its ancestors). Instead of running a separate
+    traversal per module, reachability is computed in a single pass over
+    the graph's condensation (its strongly connected components, i.e. the
+    dependency cycles, collapsed into single nodes) in topological order.
+    Each component's reachable modules are kept as an integer bitmask over
+    the module indexes and built by OR-ing its neighbours' masks.
+    :param graph: Graph of module dependencies
+    :param reverse: If True, compute ancestors rather than descendants
+    :return: Dictionary mapping each module to its set of reachable modules
+    """
+    node_names = list(graph.nodes)
+    index = dict((n, i) for i, n in enumerate(node_names))
+    cg = nx.condensation(graph)
+    order = list(nx.topological_sort(cg))
+    if reverse:
+        neighbors = cg.predecessors
+    else:
+        # Visit imported modules before the modules importing them
+        neighbors = cg.successors
+        order.reverse()
+
+    members = {}
+    reachable_mask = {}
+    for c in order:
+        c_members = cg.nodes[c]['members']
+        member_mask = 0
+        for n in c_members:
+            member_mask |= 1 << index[n]
+        members[c] = member_mask
+        mask = 0
+        for nc in neighbors(c):
+            mask |= members[nc] | reachable_mask[nc]
+        if len(c_members) > 1:
+            # Modules in a dependency cycle reach each other
+            mask |= member_mask
+        reachable_mask[c] = mask
+
+    reachable = {}
+    mapping = cg.graph['mapping']
+    for node_name in node_names:
+        # Like nx.descendants()/nx.ancestors(), exclude the module itself
+        mask = reachable_mask[mapping[node_name]] & ~(1 << index[node_name])
+        nodes = set()
+        while mask:
+            low_bit = mask & -mask
+            nodes.add(node_names[low_bit.bit_length() - 1])
+            mask ^= low_bit
+        reachable[node_name] = nodes
+    return reachable
+
+
+def print_impacting_modules(single_node=None, json_out=None, ctx=None):
     """
     For each module, print a list of modules that the module is depending on,
     i.e. modules whose change can potentially impact the module. The function
     shows all levels of dependency, not just the immediately imported
     modules.  If the json_out argument is not None, then the output will be
     recorded there instead of on stdout.
+    :param ctx: Context to work on (see get_context())
     :return:
     """
     if json_out is None:
         print('\n===Impacting Modules===')
     else:
         json_out['impacting_modules'] = {}
-    for node_name in G.nodes_iter():
-        if single_node and (node_name!=single_node):
-            continue
-        descendants = nx.descendants(G, node_name)
+    ctx = get_context(ctx)
+    G = ctx.graph
+    if single_node:
+        # A single query only needs a single traversal
+        node_names = [n for n in [single_node] if n in G]
+        reachable = dict((n, ctx.descendants(n)) for n in node_names)
+    else:
+        node_names = G.nodes()
+        reachable = ctx.reachable()
+    if json_out is None:
+        markers = ctx.markers()
+    for node_name in node_names:
+        descendants = reachable[node_name]
         if json_out is None:
-            print(augment_format_string(node_name, '\n%s:') % node_name)
+            print('\n%s:%s' % (node_name, markers[node_name]))
         else:
             json_out['impacting_modules'][node_name] = []
         for d in descendants:
             if json_out is None:
-                print(augment_format_string(d, '    %s') % d)
+                print('    %s%s' % (d, markers[d]))
             else:
                 json_out['impacting_modules'][node_name].append(d)
 
-def augment_format_string(node_name, fmts):
+def augment_format_string(node_name, fmts, ctx=None):
     """
     Depending on the tag for the specified node, this function will add
     a marker to the specified format string. Tags can currently be 'rfc'
     or 'draft', the marker is '*' (asterisk)
     :param node_name: Node name to query
     :param fmts: format string to augment
+    :param ctx: Context to work on (see get_context())
     :return: Augmented format string
     """
-    module_tag = G.node[node_name][TAG_ATTR]
+    module_tag = get_context(ctx).graph.nodes[node_name][TAG_ATTR]
     if module_tag == RFC_TAG:
         return fmts + ' *'
     if module_tag == UNKNOWN_TAG:
@@ -257,151 +671,206 @@ def augment_format_string(node_name, fmts):
     return fmts
 
 
-def print_impacted_modules(single_node=None, json_out=None):
+def get_markers(graph):
+    """
+    Compute the marker that augment_format_string() would add for each node
+    in the graph, so that print loops can append it without looking up the
+    node's tag on every printed line.
+    :param graph: Graph whose nodes to compute markers for
+    :return: Dictionary of node name to marker string
+    """
+    markers = {}
+    for node_name, module_tag in graph.nodes(data=TAG_ATTR):
+        if module_tag == RFC_TAG:
+            markers[node_name] = ' *'
+        elif module_tag == UNKNOWN_TAG:
+            markers[node_name] = ' (?)'
+        else:
+            markers[node_name] = ''
+    return markers
+
+
+def print_impacted_modules(single_node=None, json_out=None, ctx=None):
     """
      For each module, print a list of modules that depend on the module, i.e.
      modules that would be impacted by a change in this module. The function
      shows all levels of dependency, not just the immediately impacted
      modules.  If the json_out argument is not None, then the output will be
      recorded there rather than printed on stdout.
+    :param ctx: Context to work on (see get_context())
     :return:
     """
     if json_out is None:
         print('\n===Impacted Modules===')
     else:
         json_out['impacted_modules'] = {}
-    for node_name in G.nodes_iter():
-        if single_node and (node_name!=single_node):
-            continue
-        ancestors = nx.ancestors(G, node_name)
+    ctx = get_context(ctx)
+    G = ctx.graph
+    if single_node:
+        # A single query only needs a single traversal
+        node_names = [n for n in [single_node] if n in G]
+        reachable = dict((n, ctx.ancestors(n)) for n in node_names)
+    else:
+        node_names = G.nodes()
+        reachable = ctx.reachable(reverse=True)
+    if json_out is None:
+        markers = ctx.markers()
+    for node_name in node_names:
+        ancestors = reachable[node_name]
         if len(ancestors) > 0:
             if json_out is None:
-                print(augment_format_string(node_name, '\n%s:') % node_name)
+                print('\n%s:%s' % (node_name, markers[node_name]))
             else:
                 json_out['impacted_modules'][node_name] = []
             for a in ancestors:
                 if json_out is None:
-                    print(augment_format_string(a, '    %s') % a)
+                    print('    %s%s' % (a, markers[a]))
                 else:
                     json_out['impacted_modules'][node_name].append(a)
 
 
-def get_subgraph_for_node(node_name):
+def get_subgraph_for_node(node_name, ctx=None):
     """
     Prints the dependency graph for only the specified node_name (a full dependency
     graph can be difficult to read).
     :param node_name: Node for which to print the sub-graph
+    :param ctx: Context to work on (see get_context())
     :return:
     """
-    ancestors = nx.ancestors(G, node_name)
+    ctx = get_context(ctx)
+    if node_name not in ctx.graph:
+        # Fail like nx.ancestors() does
+        raise nx.NetworkXError("The node %s is not in the graph." % node_name)
+    # Unless the ancestors of all modules have already been computed, this
+    # is a breadth-first search over the context's predecessor snapshot,
+    # which is taken once and shared by the sub-graphs of all modules
+    ancestors = ctx.ancestors(node_name)
     ancestors.add(node_name)
-    return nx.subgraph(G, ancestors)
+    return nx.subgraph(ctx.graph, ancestors)
 
 
-def print_dependents(graph, preamble_list, imports):
+def print_dependents(graph, preamble_list, imports, markers=None):
     """
     Print the immediate dependencies (imports/includes), and for each
-    immediate dependency print its dependencies
+    immediate dependency print its dependencies. The tree is walked with an
+    explicit stack, so deep dependency chains do not hit the recursion
+    limit.
     :param graph: Dictionary containing the subgraph of dependencies that
                   we are about to print
     :param preamble_list: Preamble list, list of string to print out before each
                dependency (Provides the offset for higher order dependencies)
     :param imports: List of immediate imports/includes
+    :param markers: Dictionary of node name to marker, as returned by
+                    get_markers(); taken from the context for G if not
+                    specified
     :return:
     """
-    # Create the preamble string for the current level
-    preamble = ''
-    for preamble_string in preamble_list:
-        preamble += preamble_string
+    if markers is None:
+        markers = get_context().markers()
+    # The tree is collected in a buffer and written out in one go
+    out = []
+    preamble = ''.join(preamble_list)
     # Print a newline for the current level
-    print(preamble + '  |')
-    for i in range(len(imports)):
-        print(augment_format_string(imports[i], preamble + '  +--> %s') % imports[i])
+    out.append(preamble + '  |\n')
+    # Each frame holds a list of imports, the index of the next import to
+    # print, the preamble for that level and whether a newline must be
+    # printed before resuming the level
+    stack = [(imports, 0, preamble, False)]
+    while stack:
+        imports, i, preamble, separate = stack.pop()
+        if separate:
+            out.append(preamble + '  |\n')
+        if i == len(imports):
+            continue
+        imp = imports[i]
+        is_last = i == len(imports) - 1
+        out.append('%s  +--> %s%s\n' % (preamble, imp, markers[imp]))
         # Determine if a dependency has dependencies on its own; if yes,
         # print them out before moving onto the next dependency
-        try:
-            imp_imports = graph[imports[i]]
-            if i < (len(imports) - 1):
-                preamble_list.append('  |   ')
-            else:
-                preamble_list.append('      ')
-            print_dependents(graph, preamble_list, imp_imports)
-            preamble_list.pop(-1)
+        if imp in graph:
             # Only print a newline if we're NOT the last processed module
-            if i < (len(imports) - 1):
-                print(preamble + '  |')
-        except KeyError:
-            pass
+            if not is_last:
+                stack.append((imports, i + 1, preamble, True))
+            if is_last:
+                sub_preamble = preamble + '      '
+            else:
+                sub_preamble = preamble + '  |   '
+            out.append(sub_preamble + '  |\n')
+            stack.append((graph[imp], 0, sub_preamble, False))
+        else:
+            stack.append((imports, i + 1, preamble, False))
+    sys.stdout.write(''.join(out))
 
 
-def print_dependency_tree(single_node=None):
+def print_dependency_tree(single_node=None, ctx=None):
     """
     For each module, print the dependency tree for imported modules
+    :param ctx: Context to work on (see get_context())
     :return: None
     """
     print('\n=== Module Dependency Trees ===')
-    for node_name in G.nodes_iter():
+    ctx = get_context(ctx)
+    markers = ctx.markers()
+    successors = ctx.successors()
+    for node_name, module_tag in ctx.graph.nodes(data=TAG_ATTR):
         if single_node and (node_name != single_node):
             continue
-        if G.node[node_name][TAG_ATTR] != UNKNOWN_TAG:
-            dg = nx.dfs_successors(G, node_name)
+        if module_tag != UNKNOWN_TAG:
+            dg = get_dfs_successors(successors, node_name)
             plist = []
-            print(augment_format_string(node_name, '\n%s:') % node_name)
+            print('\n%s:%s' % (node_name, markers[node_name]))
             if len(dg):
                 imports = dg[node_name]
-                print_dependents(dg, plist, imports)
+                print_dependents(dg, plist, imports, markers)
 
 
-def return_dependency_tree_as_json(graph=None, ignore_exact=[], ignore_partial=[], yang_dict={}):
+def return_dependency_tree_as_json(graph=None, ignore_exact=None, ignore_partial=None, yang_dict=None, ctx=None):
     output = {}
     output['nodes'] = []
     output['links'] = []
-    idx_arr = []
+    # Index of each node in output['nodes'], used to look up link endpoints
+    name_to_idx = {}
+    # Match all partial names with a single regex search per node. Empty
+    # partial names would match every node and are dropped.
+    ignore_partial = [partial for partial in (ignore_partial or []) if partial]
+    # Exact names are looked up once per node
+    ignore_exact = frozenset(ignore_exact or ())
+    if yang_dict is None:
+        yang_dict = {}
+    if ignore_partial:
+        search_partial = re.compile('|'.join(map(re.escape, ignore_partial))).search
+    else:
+        search_partial = None
     if not graph:
-        graph = G
-    for node_name in graph.nodes_iter():
+        graph = get_context(ctx).graph
+    for node_name in graph.nodes:
         if ignore_exact and (node_name in ignore_exact):
             continue
-        if ignore_partial and len(ignore_partial)>0:
-            partial_found = False
-            for partial in ignore_partial:
-                if len(partial)==0:
-                    continue
-                if node_name and (partial in node_name):
-                    partial_found = True
-            if partial_found:
-                continue
+        if node_name and search_partial and search_partial(node_name):
+            continue
         draft_email = yang_dict.get(node_name, None)
         if draft_email != None:
             output['nodes'].append({'name': node_name, 'email' : draft_email})
         else:
             output['nodes'].append({'name': node_name })
 
-        idx_arr.append(node_name)
-    for (z, a) in graph.edges_iter():
-        if a in ignore_exact or z in ignore_exact:
+        name_to_idx[node_name] = len(name_to_idx)
+    # Only keep the edges connecting two of the nodes kept above; this
+    # applies the same ignore filters without re-running them per edge
+    for (z, a) in graph.edges:
+        if a not in name_to_idx or z not in name_to_idx:
             continue
-        if len(ignore_partial)>0:
-            partial_found = False
-            for partial in ignore_partial:
-                if len(partial)==0:
-                    continue
-                if partial in a or partial in z:
-                    partial_found = True
-            if partial_found:
-                continue
-        a_idx = idx_arr.index(a)
-        z_idx = idx_arr.index(z)
         output['links'].append(
             {
-                'source': a_idx,
-                'target': z_idx,
+                'source': name_to_idx[a],
+                'target': name_to_idx[z],
                 'value': 1.0
             })
     return output
 
         
-def print_dependency_tree_as_json(graph=None, filename=None, ignore_exact=[], ignore_partial=[], yang_dict={}):
+def print_dependency_tree_as_json(graph=None, filename=None, ignore_exact=None, ignore_partial=None, yang_dict=None,
+                                  ctx=None):
     """
     """
     if filename==None:
@@ -410,18 +879,27 @@ def print_dependency_tree_as_json(graph=None, filename=None, ignore_exact=[], ig
     output = return_dependency_tree_as_json(
         graph=graph,
         ignore_exact=ignore_exact,
-        ignore_partial=ignore_partial, yang_dict=yang_dict)
-    with open(filename, 'w') as f:
-        f.write(json.dumps(output, indent=2, sort_keys=True))
-        f.close
-
-def print_dependency_emails(graph=None, ignore_exact=[], ignore_partial=[], yang_dict={}):
+        ignore_partial=ignore_partial, yang_dict=yang_dict, ctx=ctx)
+    data = None
+    if orjson is not None:
+        data = orjson.dumps(output, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+        # orjson writes non-ASCII characters and DEL (e.g. in emails) as
+        # raw bytes, whereas json escapes them; only use its output when
+        # the two agree
+        if not data.isascii() or b'\x7f' in data:
+            data = None
+    if data is None:
+        data = json.dumps(output, indent=2, sort_keys=True).encode('ascii')
+    with open(filename, 'wb') as f:
+        f.write(data)
+
+def print_dependency_emails(graph=None, ignore_exact=None, ignore_partial=None, yang_dict=None, ctx=None):
     """
     """
     output = return_dependency_tree_as_json(
         graph=graph,
         ignore_exact=ignore_exact,
-        ignore_partial=ignore_partial, yang_dict=yang_dict)
+        ignore_partial=ignore_partial, yang_dict=yang_dict, ctx=ctx)
     emails = set()
     for node in output["nodes"]:
         email = node.get("email", None)
@@ -430,44 +908,51 @@ def print_dependency_emails(graph=None, ignore_exact=[], ignore_partial=[], yang
     for mail in emails:
         print(" %s " % mail)
 
-def prune_standalone_nodes():
+def prune_standalone_nodes(ctx=None):
     """
     Remove from the module dependency graph all modules that do not have any
     dependencies (i.e they neither import/include any modules nor are they
     imported/included by any modules)
+    :param ctx: Context to work on (see get_context())
     :return: the connected module dependency graph
     """
+    G = get_context(ctx).graph
+    # A module has neither ancestors nor descendants iff it has no edges.
+    # Copy the whole graph and remove the standalone modules, which keeps
+    # the nodes and edges in G's order (a subgraph view may not).
     ng = nx.DiGraph(G)
-    for node_name in G.nodes_iter():
-        ancestors = nx.ancestors(G, node_name)
-        descendants = nx.descendants(G, node_name)
-        if len(ancestors) == 0 and len(descendants) == 0:
-            ng.remove_node(node_name)
+    ng.remove_nodes_from([n for n, d in G.degree if d == 0])
     return ng
 
 
-def get_dependent_modules():
+def get_dependent_modules(ctx=None):
     print('\n===Dependent Modules===')
-    for node_name in G.nodes_iter():
-        dependents = nx.bfs_predecessors(G, node_name)
+    G = get_context(ctx).graph
+    for node_name in G.nodes:
+        dependents = dict(nx.bfs_predecessors(G, node_name))
         if len(dependents):
             print(dependents)
 
 
-def init(rfc_repos, draft_repos, recurse=False, verbose=False):
+def init(rfc_repos, draft_repos, recurse=False, verbose=False, jobs=None, ctx=None):
     """
     Initialize the dependency graph
     :param rfc_repos: List of local repositories for yang modules defined in
                       IETF RFCs
     :param draft_repos: List of local repositories for yang modules defined in
                         IETF drafts
+    :param jobs: Number of worker processes used to parse yang files
+                 (default: number of CPUs)
+    :param ctx: Context whose graph is initialized (see get_context())
     :return: None
     """
+    ctx = get_context(ctx)
+    G = ctx.graph
     rfc_yang_files = get_local_yang_files(rfc_repos, recurse)
     if verbose:
         print("\n*** Scanning %d RFC yang module files for 'import' and 'revision' statements..."
               % len(rfc_yang_files))
-    get_yang_modules(rfc_yang_files, RFC_TAG)
+    get_yang_modules(rfc_yang_files, RFC_TAG, jobs=jobs, ctx=ctx)
     num_rfc_modules = len(G.nodes())
     if verbose:
         print('\n*** Found %d RFC yang modules.' % num_rfc_modules)
@@ -476,21 +961,17 @@ def init(rfc_repos, draft_repos, recurse=False, verbose=False):
     if verbose:
         print("\n*** Scanning %d draft yang module files for 'import' and 'revision' statements..." %
               len(draft_yang_files))
-    get_yang_modules(draft_yang_files, DRAFT_TAG)
+    get_yang_modules(draft_yang_files, DRAFT_TAG, jobs=jobs, ctx=ctx)
     num_draft_modules = len(G.nodes()) - num_rfc_modules
     if verbose:
         print('\n*** Found %d draft yang modules.' % num_draft_modules)
 
     if verbose:
-        print("\n*** Analyzing imports...")
-    get_unknown_modules(verbose)
+        print("\n*** Analyzing imports and creating module dependencies...")
+    get_module_dependencies(add_unknown=True, verbose=verbose, ctx=ctx)
     num_unknown_modules = len(G.nodes()) - (num_rfc_modules + num_draft_modules)
     if verbose:
-        print('\n*** Found %d imported/included yang modules that were scanned.' % num_unknown_modules)
-
-    if verbose:
-        print('\n*** Creating module dependencies...')
-    get_module_dependencies()
+        print('\n*** Found %d imported/included yang modules that were not scanned.' % num_unknown_modules)
     if verbose:
         print('\nInitialization finished.\n')
 
@@ -513,6 +994,9 @@ def plot_module_dependency_graph(graph):
 
     pos = nx.spring_layout(graph, iterations=2000)
 
+    # matplotlib is not imported by this module; NetworkX imports it when
+    # drawing, so it is only loaded (and only required) for plotting
+
     # Draw RFC nodes (yang modules) in red
     nx.draw_networkx_nodes(graph, pos=pos, nodelist=prune_graph_nodes(graph, RFC_TAG), node_size=200,
                            node_shape='s', node_color='red', alpha=0.5, linewidths=0.5)
@@ -526,7 +1010,7 @@ def plot_module_dependency_graph(graph):
                            node_shape='^', node_color='orange', alpha=1.0, linewidths=0.5)
 
     # Draw edges in light gray (fairly transparent)
-    nx.draw_networkx_edges(graph, pos=pos, alpha=0.25, linewidths=0.1, arrows=False)
+    nx.draw_networkx_edges(graph, pos=pos, alpha=0.25, width=0.1, arrows=False)
 
     # Draw labels on nodes (modules)
     nx.draw_networkx_labels(graph, pos=pos, font_size=10, font_weight='bold', alpha=1.0)
@@ -0,0 +1,73 @@
+##############################################################################
+# Copyright (c) 2015 Cisco Systems  All rights reserved.
+#
+# This program and the accompanying materials are made available under the
+# terms of the Eclipse Public License v1.0 which accompanies this distribution,
+# and is available at http://www.eclipse.org/legal/epl-v10.html
+##############################################################################
+"""
+Compare symd's graph traversals with the NetworkX algorithms they replace,
+on random directed graphs with dependency cycles and self-loops.
+Run with 'python -m pytest tests' or 'python -m unittest discover tests'.
+"""
+import random
+import unittest
+
+import networkx as nx
+
+import symd
+
+
+def random_graphs(count=200, seed=0):
+    """
+    Generate random directed graphs, including cycles and self-loops
+    :param count: Number of graphs to generate
+    :param seed: Seed for the random number generator
+    :return: Iterator over graphs
+    """
+    rnd = random.Random(seed)
+    for i in range(count):
+        graph = nx.gnp_random_graph(rnd.randint(1, 40), rnd.random() * 0.2, seed=i, directed=True)
+        for n in list(graph.nodes):
+            if rnd.random() < 0.05:
+                graph.add_edge(n, n)
+        # Use string names, like yang module names
+        yield nx.relabel_nodes(graph, dict((n, 'm%d' % n) for n in graph.nodes))
+
+
+class ReachabilityTest(unittest.TestCase):
+
+    def test_reachable_modules(self):
+        for graph in random_graphs():
+            descendants = symd.get_reachable_modules(graph)
+            ancestors = symd.get_reachable_modules(graph, reverse=True)
+            for n in graph.nodes:
+                self.assertEqual(descendants[n], nx.descendants(graph, n))
+                self.assertEqual(ancestors[n], nx.ancestors(graph, n))
+
+    def test_context_queries(self):
+        for graph in random_graphs(count=50):
+            ctx = symd.Context(graph)
+            # Breadth-first search over the adjacency snapshots...
+            for n in graph.nodes:
+                self.assertEqual(ctx.descendants(n), nx.descendants(graph, n))
+                self.assertEqual(ctx.ancestors(n), nx.ancestors(graph, n))
+            # ... and copies of the reachability of all modules
+            ctx.reachable()
+            ctx.reachable(reverse=True)
+            for n in graph.nodes:
+                self.assertEqual(ctx.descendants(n), nx.descendants(graph, n))
+                self.assertEqual(ctx.ancestors(n), nx.ancestors(graph, n))
+
+
+class DependencyTreeTest(unittest.TestCase):
+
+    def test_dfs_successors(self):
+        for graph in random_graphs():
+            successors = symd.get_successor_map(graph)
+            for n in graph.nodes:
+                self.assertEqual(symd.get_dfs_successors(successors, n), nx.dfs_successors(graph, n))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+##############################################################################
+# Copyright (c) 2015 Cisco Systems  All rights reserved.
+#
+# This program and the accompanying materials are made available under the
+# terms of the Eclipse Public License v1.0 which accompanies this distribution,
+# and is available at http://www.eclipse.org/legal/epl-v10.html
+##############################################################################
+"""
+Table-driven tests for the statements parse_yang_module() accepts.
+Run with 'python -m pytest tests' or 'python -m unittest discover tests'.
+"""
+import io
+import unittest
+
+import symd
+
+# (description, yang file contents, expected parse_yang_module() result)
+CASES = [
+    ('module, unquoted name',
+     b'module foo {\n  revision 2015-01-01 {\n}\n',
+     ('foo', 'mod', (), '2015-01-01')),
+    ('module, double-quoted name',
+     b'module "foo" {\n  revision 2015-01-01 {\n}\n',
+     ('foo', 'mod', (), '2015-01-01')),
+    ('submodule, single-quoted name',
+     b"submodule 'foo-sub' {\n  revision 2015-01-01 {\n}\n",
+     ('foo-sub', 'sub', (), '2015-01-01')),
+    ('module name with revision',
+     b'module foo@2015-01-01 {\n}\n',
+     ('foo@2015-01-01', 'mod', (), None)),
+    ('import and include of the same module yield one dependency',
+     b'module foo {\n  import bar { prefix b; }\n  include bar {\n  import baz {\n  import bar {\n}\n',
+     ('foo', 'mod', ('bar', 'baz'), None)),
+    ('latest of several revisions',
+     b'module foo {\n  revision 2014-05-08 {\n  revision "2016-01-01" {\n  revision \'2015-02-03\' {\n}\n',
+     ('foo', 'mod', (), '2016-01-01')),
+    ('CRLF line endings',
+     b'module foo {\r\n  import bar {\r\n  include baz {\r\n  revision 2015-01-01 {\r\n}\r\n',
+     ('foo', 'mod', ('bar', 'baz'), '2015-01-01')),
+    ('tab separators',
+     b'module foo {\n\timport\tbar\t{\n\trevision\t2015-01-01\t{\n}\n',
+     ('foo', 'mod', ('bar',), '2015-01-01')),
+    ('keyword prefix of a longer identifier is not a statement',
+     b'module foo {\n  importer-x {\n  included-y {\n  revisions {\n}\n',
+     ('foo', 'mod', (), None)),
+    ('CR, VT and FF are not statement separators',
+     b'module foo {\n  import\rbar {\n  import bar\x0b{\n  include baz\x0c{\n}\n',
+     ('foo', 'mod', (), None)),
+    ('brace on the next line',
+     b'module foo\n{\n  import bar\n  {\n}\n',
+     (None, None, (), None)),
+    ('no module statement',
+     b'// truncated draft extraction\n  import bar {\n',
+     (None, None, ('bar',), None)),
+    ('empty file',
+     b'',
+     (None, None, (), None)),
+]
+
+
+class ParseYangModuleTest(unittest.TestCase):
+
+    def test_split_lines(self):
+        # Small files are read at once and split on newlines
+        for description, data, expected in CASES:
+            with self.subTest(description):
+                self.assertEqual(symd.parse_yang_module(data.split(b'\n')), expected)
+
+    def test_file_lines(self):
+        # Lines of a binary file (or a memory-mapped one) keep their newline
+        for description, data, expected in CASES:
+            with self.subTest(description):
+                self.assertEqual(symd.parse_yang_module(io.BytesIO(data)), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()